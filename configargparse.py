@@ -5,12 +5,14 @@ A drop-in replacement for `argparse` that allows options to also be set via conf
 """
 import argparse
 import ast
+import copy
 import csv
 import functools
 import json
 import glob
 import os
 import re
+import stat
 import sys
 import types
 from collections import OrderedDict
@@ -34,10 +36,20 @@ else:
 
 ACTION_TYPES_THAT_DONT_NEED_A_VALUE = tuple(ACTION_TYPES_THAT_DONT_NEED_A_VALUE)
 
+# used for the internal source -> settings bookkeeping, where only insertion
+# order matters. Plain dicts guarantee it (and are faster) since Python 3.7.
+if sys.version_info >= (3, 7):
+    _SettingsDict = dict
+else:
+    _SettingsDict = OrderedDict
+
 
 # global ArgumentParser instances
 _parsers = {}
 
+# max number of parsed config files kept by a parser with cache_config_files=True
+_PARSED_CONFIG_FILES_MAX_SIZE = 128
+
 def init_argument_parser(name=None, **kwargs):
     """Creates a global ArgumentParser instance with the given name,
     passing any args other than "name" to the ArgumentParser constructor.
@@ -121,7 +133,26 @@ class ConfigFileParser(object):
 
 
 class ConfigFileParserException(Exception):
-    """Raised when config file parsing failed."""
+    """Raised when config file parsing failed.
+
+    Attributes:
+        lineno: the (0-based) number of the offending line, if known
+        name: the name of the config file, if known
+        line: the offending line itself, if known
+    """
+
+    def __init__(self, *args, lineno=None, name=None, line=None):
+        super().__init__(*args)
+        self.lineno = lineno
+        self.name = name
+        self.line = line
+
+
+# fullmatch()es a single "key [=:] value [# comment]" line of a DefaultConfigFileParser file
+_DEFAULT_CONFIG_LINE_REGEX = re.compile(
+    r'(?P<key>[^:=;#\s]+)\s*'
+    r'(?:(?P<equal>[:=\s])\s*([\'"]?)(?P<value>.+?)?\3)?'
+    r'\s*(?:\s[;#]\s*(?P<comment>.*?)\s*)?')
 
 
 class DefaultConfigFileParser(ConfigFileParser):
@@ -163,19 +194,15 @@ class DefaultConfigFileParser(ConfigFileParser):
        # see ConfigFileParser.parse docstring
 
         items = OrderedDict()
+        match_line = _DEFAULT_CONFIG_LINE_REGEX.fullmatch
         for i, line in enumerate(stream):
             line = line.strip()
-            if not line or line[0] in ["#", ";", "["] or line.startswith("---"):
+            if not line or line.startswith(("#", ";", "[", "---")):
                 continue
 
-            match = re.match(r'^(?P<key>[^:=;#\s]+)\s*'
-                             r'(?:(?P<equal>[:=\s])\s*([\'"]?)(?P<value>.+?)?\3)?'
-                             r'\s*(?:\s[;#]\s*(?P<comment>.*?)\s*)?$', line)
+            match = match_line(line)
             if match:
-                key = match.group("key")
-                equal = match.group('equal')
-                value = match.group("value")
-                comment = match.group("comment")
+                key, equal, value = match.group("key", "equal", "value")
                 if value is None and equal is not None and equal != ' ':
                     value = ''
                 elif value is None:
@@ -187,23 +214,23 @@ class DefaultConfigFileParser(ConfigFileParser):
                     except Exception as e:
                         # for backward compatibility with legacy format (eg. where config value is [a, b, c] instead of proper json ["a", "b", "c"]
                         value = [elem.strip() for elem in value[1:-1].split(",")]
-                if comment:
-                    comment = comment.strip()[1:].strip()
                 items[key] = value
             else:
-                raise ConfigFileParserException("Unexpected line {} in {}: {}".format(i,
-                    getattr(stream, 'name', 'stream'), line))
+                name = getattr(stream, 'name', 'stream')
+                raise ConfigFileParserException(
+                    f"Unexpected line {i} in {name}: {line}",
+                    lineno=i, name=name, line=line)
         return items
 
     def serialize(self, items):
         # see ConfigFileParser.serialize docstring
-        r = StringIO()
+        r = []
         for key, value in items.items():
             if isinstance(value, list):
                 # handle special case of lists
                 value = "["+", ".join(map(str, value))+"]"
-            r.write("{} = {}\n".format(key, value))
-        return r.getvalue()
+            r.append("{} = {}\n".format(key, value))
+        return "".join(r)
 
 
 class ConfigparserConfigFileParser(ConfigFileParser):
@@ -240,7 +267,7 @@ class ConfigparserConfigFileParser(ConfigFileParser):
             empty_lines_in_values=False,
         )
         try:
-            config.read_string(stream.read())
+            config.read_file(stream, source=getattr(stream, "name", "<string>"))
         except Exception as e:
             raise ConfigFileParserException("Couldn't parse config file: %s" % e)
 
@@ -252,7 +279,7 @@ class ConfigparserConfigFileParser(ConfigFileParser):
                 # handle special case for lists
                 if '[' in multiLine2SingleLine and ']' in multiLine2SingleLine:
                     # ensure not a dict with a list value
-                    prelist_string = multiLine2SingleLine.split('[')[0]
+                    prelist_string = multiLine2SingleLine.partition('[')[0]
                     if '{' not in prelist_string:
                         result[k] = literal_eval(multiLine2SingleLine)
                     else:
@@ -289,9 +316,16 @@ class YAMLConfigFileParser(ConfigFileParser):
             "'mapping' (for details, see http://learn.getgrav.org/advanced/yaml).")
         return msg
 
+    # (yaml module, loader class, dumper class), set by the first _load_yaml()
+    _yaml = None
+
     def _load_yaml(self):
         """lazy-import PyYAML so that configargparse doesn't have to depend
-        on it unless this parser is used."""
+        on it unless this parser is used. Prefers the libyaml-based C loader
+        and dumper, which are many times faster than the pure-python ones."""
+        if YAMLConfigFileParser._yaml is not None:
+            return YAMLConfigFileParser._yaml
+
         try:
             import yaml
         except ImportError:
@@ -305,7 +339,8 @@ class YAMLConfigFileParser(ConfigFileParser):
             from yaml import SafeLoader
             from yaml import Dumper
 
-        return yaml, SafeLoader, Dumper
+        YAMLConfigFileParser._yaml = (yaml, SafeLoader, Dumper)
+        return YAMLConfigFileParser._yaml
 
     def parse(self, stream):
         # see ConfigFileParser.parse docstring
@@ -432,16 +467,16 @@ def get_toml_section(data, section):
     Returns ``None`` if the section is not found.
     """
     sections = parse_toml_section_name(section) if isinstance(section, str) else section
-    itemdata = data.get(sections[0])
-    if not itemdata:
-        return None
-    sections = sections[1:]
-    if sections:
-        return get_toml_section(itemdata, sections)
-    else:
+    itemdata = data
+    for name in sections:
         if not isinstance(itemdata, dict):
             return None
-        return itemdata
+        itemdata = itemdata.get(name)
+        if not itemdata:
+            return None
+    if not isinstance(itemdata, dict):
+        return None
+    return itemdata
 
 class TomlConfigParser(ConfigFileParser):
     """
@@ -482,12 +517,44 @@ class TomlConfigParser(ConfigFileParser):
     def __call__(self):
         return self
 
+    # the function that parses a TOML string, set by the first _load_toml()
+    _toml_loads = None
+
+    def _load_toml(self):
+        """lazy-import a TOML parser. The toml package is used if it's
+        installed, as it's what this parser always used, so that files it
+        accepted keep loading the same way. Otherwise the standard library's
+        tomllib (Python 3.11+) or the tomli package is used.
+
+        Returns:
+            a function that parses a TOML string into a dict
+        """
+        if TomlConfigParser._toml_loads is not None:
+            return TomlConfigParser._toml_loads
+
+        try:
+            import toml
+            loads = toml.loads
+        except ImportError:
+            try:
+                import tomllib
+            except ImportError:
+                try:
+                    import tomli as tomllib
+                except ImportError:
+                    raise ConfigFileParserException("Could not import toml, "
+                        "tomllib or tomli. It can be installed by running "
+                        "'pip install tomli'")
+            loads = tomllib.loads
+
+        TomlConfigParser._toml_loads = loads
+        return TomlConfigParser._toml_loads
+
     def parse(self, stream):
         """Parses the keys and values from a TOML config file."""
-        # parse with configparser to allow multi-line values
-        import toml
+        loads = self._load_toml()
         try:
-            config = toml.load(stream)
+            config = loads(stream.read())
         except Exception as e:
             raise ConfigFileParserException("Couldn't parse TOML file: %s" % e)
 
@@ -577,7 +644,7 @@ class IniConfigParser(ConfigFileParser):
         import configparser
         config = configparser.ConfigParser()
         try:
-            config.read_string(stream.read())
+            config.read_file(stream, source=getattr(stream, "name", "<string>"))
         except Exception as e:
             raise ConfigFileParserException("Couldn't parse INI file: %s" % e)
 
@@ -663,6 +730,19 @@ class CompositeConfigParser(ConfigFileParser):
             msg += f"[{i+1}] {guess_format_name(parser.__class__.__name__)}: {parser.get_syntax_description()} \n"
         return msg
 
+def _get_config_file_cache_key(stream):
+    """Returns a (device, inode, mtime, size) tuple identifying the file behind
+    the given stream, or None if the stream isn't backed by a regular file
+    (eg. a StringIO or a pipe) and so its parsed contents can't be cached.
+    """
+    try:
+        st = os.fstat(stream.fileno())
+    except (AttributeError, OSError, ValueError):
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
 # used while parsing args to keep track of where they came from
 _COMMAND_LINE_SOURCE_KEY = "command_line"
 _ENV_VAR_SOURCE_KEY = "environment_variables"
@@ -729,16 +809,26 @@ class ArgumentParser(argparse.ArgumentParser):
                 (eg. ["-w", "--write-out-config-file"]). Default: []
             write_out_config_file_arg_help_message: The help message to use for
                 the args in args_for_writing_out_config_file.
+            cache_config_files: If True, config files that were already parsed
+                by this parser are reused instead of being parsed again, as
+                long as the file on disk (identified by its device, inode,
+                modification time and size) hasn't changed. Only enable this if
+                config files aren't rewritten with the same size within the
+                file system's mtime resolution, and if the
+                config_file_parser_class output only depends on the contents
+                of the file itself. Default: False
         """
         # This is the only way to make positional args (tested in the argparse
         # main test suite) and keyword arguments work across both Python 2 and
-        # 3. This could be refactored to not need extra local variables.
-        add_config_file_help = kwargs.pop('add_config_file_help', True)
-        add_env_var_help = kwargs.pop('add_env_var_help', True)
-        auto_env_var_prefix = kwargs.pop('auto_env_var_prefix', None)
-        default_config_files = kwargs.pop('default_config_files', [])
-        ignore_unknown_config_file_keys = kwargs.pop(
+        # 3. Settings that are only stored are popped straight into their
+        # attributes, the rest are needed as locals further below.
+        self._add_config_file_help = kwargs.pop('add_config_file_help', True)
+        self._add_env_var_help = kwargs.pop('add_env_var_help', True)
+        self._auto_env_var_prefix = kwargs.pop('auto_env_var_prefix', None)
+        self._default_config_files = kwargs.pop('default_config_files', [])
+        self._ignore_unknown_config_file_keys = kwargs.pop(
             'ignore_unknown_config_file_keys', False)
+        self._config_file_open_func = kwargs.pop('config_file_open_func', open)
         config_file_parser_class = kwargs.pop('config_file_parser_class',
                                               DefaultConfigFileParser)
         args_for_setting_config_path = kwargs.pop(
@@ -752,23 +842,18 @@ class ArgumentParser(argparse.ArgumentParser):
             'write_out_config_file_arg_help_message', "takes the current "
             "command line args and writes them out to a config file at the "
             "given path, then exits")
-
-        self._config_file_open_func = kwargs.pop('config_file_open_func', open)
-
-        self._add_config_file_help = add_config_file_help
-        self._add_env_var_help = add_env_var_help
-        self._auto_env_var_prefix = auto_env_var_prefix
+        # parsed config files, keyed by (device, inode, mtime, size) so that
+        # the same file opened through another path (eg. a symlink) is reused
+        self._parsed_config_files = (
+            OrderedDict() if kwargs.pop('cache_config_files', False) else None)
 
         argparse.ArgumentParser.__init__(self, *args, **kwargs)
 
         # parse the additional args
         if config_file_parser_class is None:
-            self._config_file_parser = DefaultConfigFileParser()
-        else:
-            self._config_file_parser = config_file_parser_class()
+            config_file_parser_class = DefaultConfigFileParser
+        self._config_file_parser = config_file_parser_class()
 
-        self._default_config_files = default_config_files
-        self._ignore_unknown_config_file_keys = ignore_unknown_config_file_keys
         if args_for_setting_config_path:
             self.add_argument(*args_for_setting_config_path, dest="config_file",
                 required=config_arg_is_required, help=config_arg_help_message,
@@ -837,39 +922,41 @@ class ArgumentParser(argparse.ArgumentParser):
             a.is_positional_arg = not a.option_strings
 
         if ignore_help_args:
-            args = [arg for arg in args if arg not in ("-h", "--help")]
+            args = [arg for arg in args if arg not in {"-h", "--help"}]
 
         # maps a string describing the source (eg. env var) to a settings dict
         # to keep track of where values came from (used by print_values()).
         # The settings dicts for env vars and config files will then map
         # the config key to an (argparse Action obj, string value) 2-tuple.
-        self._source_to_settings = OrderedDict()
+        self._source_to_settings = _SettingsDict()
+        self._pending_default_settings = None
         if args:
-            a_v_pair = (None, list(args))  # copy args list to isolate changes
+            # no copy needed: args is already a private list at this point,
+            # and is only ever replaced by new lists (never modified) below.
+            a_v_pair = (None, args)
             self._source_to_settings[_COMMAND_LINE_SOURCE_KEY] = {'': a_v_pair}
 
         # handle auto_env_var_prefix __init__ arg by setting a.env_var as needed
         if self._auto_env_var_prefix is not None:
-            for a in self._actions:
-                config_file_keys = self.get_possible_config_keys(a)
-                if config_file_keys and not (a.env_var or a.is_positional_arg
-                    or a.is_config_file_arg or a.is_write_out_config_file_arg or
-                    isinstance(a, argparse._VersionAction) or
-                    isinstance(a, argparse._HelpAction)):
-                    stripped_config_file_key = config_file_keys[0].strip(
-                        self.prefix_chars)
-                    a.env_var = (self._auto_env_var_prefix +
-                                 stripped_config_file_key).replace('-', '_').upper()
+            self._ensure_auto_env_vars()
 
         # add env var settings to the commandline that aren't there already
         env_var_args = []
         nargs = False
-        actions_with_env_var_values = [a for a in self._actions
-            if not a.is_positional_arg and a.env_var and a.env_var in env_vars
-                and not already_on_command_line(args, a.option_strings, self.prefix_chars)]
-        for action in actions_with_env_var_values:
+        arg_names = get_command_line_arg_names(args, self.prefix_chars)
+        # look up each env var only once, since os.environ lookups aren't free
+        actions_with_env_var_values = []
+        for a in self._actions:
+            # positional args (eg. sub-parsers) may not have an env_var attr
+            if a.is_positional_arg or not a.env_var:
+                continue
+            env_var_value = env_vars.get(a.env_var)
+            if env_var_value is None or not arg_names.isdisjoint(a.option_strings):
+                continue
+            actions_with_env_var_values.append((a, env_var_value))
+
+        for action, value in actions_with_env_var_values:
             key = action.env_var
-            value = env_vars[key]
             # Make list-string into list.
             if action.nargs or isinstance(action, argparse._AppendAction):
                 nargs = True
@@ -887,21 +974,19 @@ class ArgumentParser(argparse.ArgumentParser):
             args = args + env_var_args
         else:
             args = env_var_args + args
+        # keep arg_names in sync with args by adding just the new args
+        arg_names.update(get_command_line_arg_names(env_var_args, self.prefix_chars))
 
         if env_var_args:
-            self._source_to_settings[_ENV_VAR_SOURCE_KEY] = OrderedDict(
-                [(a.env_var, (a, env_vars[a.env_var]))
-                    for a in actions_with_env_var_values])
+            self._source_to_settings[_ENV_VAR_SOURCE_KEY] = _SettingsDict(
+                [(a.env_var, (a, value))
+                    for a, value in actions_with_env_var_values])
 
         # before parsing any config files, check if -h was specified.
         supports_help_arg = any(
             a for a in self._actions if isinstance(a, argparse._HelpAction))
         skip_config_file_parsing = supports_help_arg and (
-            "-h" in args or "--help" in args)
-
-        # prepare for reading config file(s)
-        known_config_keys = {config_key: action for action in self._actions
-            for config_key in self.get_possible_config_keys(action)}
+            "-h" in arg_names or "--help" in arg_names)
 
         # open the config file(s)
         config_streams = []
@@ -912,10 +997,15 @@ class ArgumentParser(argparse.ArgumentParser):
         elif not skip_config_file_parsing:
             config_streams = self._open_config_files(args)
 
+        # prepare for reading config file(s)
+        if config_streams:
+            known_config_keys = {config_key: action for action in self._actions
+                for config_key in self.get_possible_config_keys(action)}
+
         # parse each config file
         for stream in reversed(config_streams):
             try:
-                config_items = self._config_file_parser.parse(stream)
+                config_items = self._parse_config_file(stream)
             except ConfigFileParserException as e:
                 self.error(str(e))
             finally:
@@ -924,27 +1014,27 @@ class ArgumentParser(argparse.ArgumentParser):
 
             # add each config item to the commandline unless it's there already
             config_args = []
+            config_settings = None
             nargs = False
             for key, value in config_items.items():
                 if key in known_config_keys:
                     action = known_config_keys[key]
-                    discard_this_key = already_on_command_line(
-                        args, action.option_strings, self.prefix_chars)
+                    discard_this_key = not arg_names.isdisjoint(
+                        action.option_strings)
                 else:
                     action = None
                     discard_this_key = self._ignore_unknown_config_file_keys or \
-                        already_on_command_line(
-                            args,
-                            [self.get_command_line_key_for_unknown_config_file_setting(key)],
-                            self.prefix_chars)
+                        self.get_command_line_key_for_unknown_config_file_setting(
+                            key) in arg_names
 
                 if not discard_this_key:
                     config_args += self.convert_item_to_command_line_arg(
                         action, key, value)
-                    source_key = "%s|%s" %(_CONFIG_FILE_SOURCE_KEY, stream.name)
-                    if source_key not in self._source_to_settings:
-                        self._source_to_settings[source_key] = OrderedDict()
-                    self._source_to_settings[source_key][key] = (action, value)
+                    if config_settings is None:
+                        source_key = "%s|%s" %(_CONFIG_FILE_SOURCE_KEY, stream.name)
+                        config_settings = self._source_to_settings.setdefault(
+                            source_key, _SettingsDict())
+                    config_settings[key] = (action, value)
                     if (action and action.nargs or
                         isinstance(action, argparse._AppendAction)):
                         nargs = True
@@ -953,27 +1043,14 @@ class ArgumentParser(argparse.ArgumentParser):
                 args = args + config_args
             else:
                 args = config_args + args
+            arg_names.update(get_command_line_arg_names(config_args, self.prefix_chars))
 
-        # save default settings for use by print_values()
-        default_settings = OrderedDict()
-        for action in self._actions:
-            cares_about_default_value = (not action.is_positional_arg or
-                action.nargs in [OPTIONAL, ZERO_OR_MORE])
-            if (already_on_command_line(args, action.option_strings, self.prefix_chars) or
-                    not cares_about_default_value or
-                    action.default is None or
-                    action.default == SUPPRESS or
-                    isinstance(action, ACTION_TYPES_THAT_DONT_NEED_A_VALUE)):
-                continue
-            else:
-                if action.option_strings:
-                    key = action.option_strings[-1]
-                else:
-                    key = action.dest
-                default_settings[key] = (action, str(action.default))
-
-        if default_settings:
-            self._source_to_settings[_DEFAULTS_SOURCE_KEY] = default_settings
+        # default settings are only needed by print_values() and friends, so
+        # only remember what's needed to compute them on first use. The
+        # defaults are captured now, so that actions added or defaults changed
+        # after this call don't show up in them.
+        self._pending_default_settings = (
+            arg_names, [(action, action.default) for action in self._actions])
 
         # parse all args (including commandline, config file, and env var)
         namespace, unknown_args = argparse.ArgumentParser.parse_known_args(
@@ -986,6 +1063,31 @@ class ArgumentParser(argparse.ArgumentParser):
         self.write_config_file(namespace, output_file_paths, exit_after=True)
         return namespace, unknown_args
 
+    def _ensure_auto_env_vars(self):
+        """Sets a.env_var based on auto_env_var_prefix for all actions that
+        can be set in a config file and don't have an env var yet. This is
+        skipped if no actions were added since the last time it ran.
+        """
+        # args can be added through argument groups which don't go through
+        # this parser's methods, so compare against the actions list itself.
+        actions_state = (len(self._actions),
+                         self._actions[-1] if self._actions else None)
+        if getattr(self, '_auto_env_vars_actions_state', None) == actions_state:
+            return
+
+        for a in self._actions:
+            config_file_keys = self.get_possible_config_keys(a)
+            if config_file_keys and not (a.env_var or a.is_positional_arg
+                or a.is_config_file_arg or a.is_write_out_config_file_arg or
+                isinstance(a, argparse._VersionAction) or
+                isinstance(a, argparse._HelpAction)):
+                stripped_config_file_key = config_file_keys[0].strip(
+                    self.prefix_chars)
+                a.env_var = (self._auto_env_var_prefix +
+                             stripped_config_file_key).replace('-', '_').upper()
+
+        self._auto_env_vars_actions_state = actions_state
+
     def get_source_to_settings_dict(self):
         """
         If called after `parse_args()` or `parse_known_args()`, returns a dict that contains up to 4 keys corresponding
@@ -1001,8 +1103,72 @@ class ArgumentParser(argparse.ArgumentParser):
             dict[str, dict[str, tuple[argparse.Action, str]]]: source to settings dict
         """
         # _source_to_settings is set in parse_know_args().
+        self._add_default_settings()
         return self._source_to_settings # type:ignore[attribute-error]
 
+    def _add_default_settings(self):
+        """Adds the default settings to _source_to_settings if they weren't
+        added yet since the last call to `parse_known_args()`."""
+        pending_default_settings = getattr(self, '_pending_default_settings', None)
+        if pending_default_settings is None:
+            return
+        self._pending_default_settings = None
+
+        arg_names, action_defaults = pending_default_settings
+        default_settings = _SettingsDict()
+        for action, default in action_defaults:
+            option_strings = action.option_strings
+            cares_about_default_value = (option_strings or
+                action.nargs in (OPTIONAL, ZERO_OR_MORE))
+            if (not cares_about_default_value or
+                    default is None or
+                    default == SUPPRESS or
+                    isinstance(action, ACTION_TYPES_THAT_DONT_NEED_A_VALUE) or
+                    not arg_names.isdisjoint(option_strings)):
+                continue
+            else:
+                if option_strings:
+                    key = option_strings[-1]
+                else:
+                    key = action.dest
+                default_settings[key] = (action, str(default))
+
+        if default_settings:
+            self._source_to_settings[_DEFAULTS_SOURCE_KEY] = default_settings
+
+
+    def _parse_config_file(self, stream):
+        """Parses the given config file stream with this parser's
+        `ConfigFileParser`. With cache_config_files=True, if the stream is a
+        file on disk that was already parsed and hasn't changed since, a copy
+        of the earlier result is returned instead.
+
+        Returns:
+            OrderedDict: config file items
+        """
+        parsed_config_files = self._parsed_config_files
+        if parsed_config_files is None:
+            return self._config_file_parser.parse(stream)
+
+        cache_key = _get_config_file_cache_key(stream)
+        if cache_key is None:
+            return self._config_file_parser.parse(stream)
+
+        if cache_key in parsed_config_files:
+            parsed_config_files.move_to_end(cache_key)
+        else:
+            parsed_config_files[cache_key] = self._config_file_parser.parse(stream)
+            if len(parsed_config_files) > _PARSED_CONFIG_FILES_MAX_SIZE:
+                parsed_config_files.popitem(last=False)
+
+        return copy.deepcopy(parsed_config_files[cache_key])
+
+    def clear_config_cache(self):
+        """Forgets all config files previously parsed by this parser, so that
+        they are re-read from disk the next time they are used. Only has an
+        effect with cache_config_files=True."""
+        if self._parsed_config_files is not None:
+            self._parsed_config_files.clear()
 
     def write_config_file(self, parsed_namespace, output_file_paths, exit_after=False):
         """Write the given settings to output files.
@@ -1022,6 +1188,7 @@ class ArgumentParser(argparse.ArgumentParser):
                     output_file_path, e))
         if output_file_paths:
             # generate the config file contents
+            self._add_default_settings()
             config_items = self.get_items_for_config_file_output(
                 self._source_to_settings, parsed_namespace)
             file_contents = self._config_file_parser.serialize(config_items)
@@ -1065,12 +1232,12 @@ class ArgumentParser(argparse.ArgumentParser):
         for source, settings in source_to_settings.items():
             if source == _COMMAND_LINE_SOURCE_KEY:
                 _, existing_command_line_args = settings['']
+                arg_names = get_command_line_arg_names(
+                    existing_command_line_args, self.prefix_chars)
                 for action in self._actions:
                     config_file_keys = self.get_possible_config_keys(action)
                     if config_file_keys and not action.is_positional_arg and \
-                        already_on_command_line(existing_command_line_args,
-                                                action.option_strings,
-                                                self.prefix_chars):
+                        not arg_names.isdisjoint(action.option_strings):
                         value = getattr(parsed_namespace, action.dest, None)
                         if value is not None:
                             if isinstance(value, bool):
@@ -1112,32 +1279,35 @@ class ArgumentParser(argparse.ArgumentParser):
         """
         args = []
 
+        boolean_optional_action = is_boolean_optional_action(action)
         if action is None:
             command_line_key = \
                 self.get_command_line_key_for_unknown_config_file_setting(key)
         else:
-            if not is_boolean_optional_action(action):
+            if not boolean_optional_action:
                 command_line_key = action.option_strings[-1]
 
         # handle boolean value
         if action is not None and isinstance(action, ACTION_TYPES_THAT_DONT_NEED_A_VALUE):
             assert isinstance(value, str), "config parser should convert anything that is not a list to string."
-            if value.lower() in ("true", "yes", "on", "1"):
-                if not is_boolean_optional_action(action):
+            value_lower = value.lower()
+            if value_lower in {"true", "yes", "on", "1"}:
+                if not boolean_optional_action:
                     args.append( command_line_key )
                 else:
                     # --foo
                     args.append(action.option_strings[0])
-            elif value.lower() in ("false", "no", "off", "0"):
+            elif value_lower in {"false", "no", "off", "0"}:
                 # don't append when set to "false" / "no"
-                if not is_boolean_optional_action(action):
+                if not boolean_optional_action:
                     pass
                 else:
                     # --no-foo
                     args.append(action.option_strings[1])
             elif isinstance(action, argparse._CountAction):
+                option_strings = tuple(action.option_strings)
                 for arg in args:
-                    if any([arg.startswith(s) for s in action.option_strings]):
+                    if arg.startswith(option_strings):
                         value = 0
                 args += [action.option_strings[0]] * int(value)
             else:
@@ -1145,7 +1315,7 @@ class ArgumentParser(argparse.ArgumentParser):
                            "'false', 'yes', 'no', 'on', 'off', '1' or '0'" % (key, value))
         elif isinstance(value, list):
             accepts_list_and_has_nargs = action is not None and action.nargs is not None and (
-                   isinstance(action, argparse._StoreAction) or isinstance(action, argparse._AppendAction)
+                   isinstance(action, (argparse._StoreAction, argparse._AppendAction))
             ) and (
                 action.nargs in ('+', '*') or (isinstance(action.nargs, int) and action.nargs > 1)
             )
@@ -1154,14 +1324,12 @@ class ArgumentParser(argparse.ArgumentParser):
                 for list_elem in value:
                     if accepts_list_and_has_nargs and isinstance(list_elem, list):
                         args.append(command_line_key)
-                        for sub_elem in list_elem:
-                            args.append(str(sub_elem))
+                        args.extend(map(str, list_elem))
                     else:
                         args.append( "%s=%s" % (command_line_key, str(list_elem)) )
             elif accepts_list_and_has_nargs:
                 args.append( command_line_key )
-                for list_elem in value:
-                    args.append( str(list_elem) )
+                args.extend(map(str, value))
             else:
                 self.error(("%s can't be set to a list '%s' unless its action type is changed "
                             "to 'append' or nargs is set to '*', '+', or > 1") % (key, value))
@@ -1187,10 +1355,23 @@ class ArgumentParser(argparse.ArgumentParser):
         if getattr(action, 'is_write_out_config_file_arg', None):
             return keys
 
+        # the keys are cached on the action, and only need to be recomputed if
+        # its option strings change (eg. when conflict_handler="resolve"
+        # removes some of them) or it is shared with a parser that uses
+        # different prefix_chars. The cache holds a tuple and every caller
+        # gets its own list, so callers (eg. subclasses extending the
+        # result) can't modify the cached keys.
+        cache_key = (self.prefix_chars, tuple(action.option_strings))
+        cached = getattr(action, '_config_keys_cache', None)
+        if cached is not None and cached[0] == cache_key:
+            return list(cached[1])
+
+        long_option_prefixes = tuple(2*c for c in self.prefix_chars)  # eg. ('--',)
         for arg in action.option_strings:
-            if any(arg.startswith(2*c) for c in self.prefix_chars):
+            if arg.startswith(long_option_prefixes):
                 keys += [arg[2:], arg] # eg. for '--bla' return ['bla', '--bla']
 
+        action._config_keys_cache = (cache_key, tuple(keys))
         return keys
 
     def _open_config_files(self, command_line_args):
@@ -1219,14 +1400,30 @@ class ArgumentParser(argparse.ArgumentParser):
         if not user_config_file_arg_actions:
             return config_files
 
-        for action in user_config_file_arg_actions:
-            # try to parse out the config file path by using a clean new
-            # ArgumentParser that only knows this one arg/action.
+        # skip the (relatively expensive) parsing below for args that can't
+        # possibly have been given and have no default path to fall back on.
+        user_config_file_arg_actions = [
+            a for a in user_config_file_arg_actions if a.default or
+            may_be_on_command_line(command_line_args, a.option_strings,
+                                   self.prefix_chars)]
+
+        if not user_config_file_arg_actions:
+            return config_files
+
+        # try to parse out the config file paths by using a clean new
+        # ArgumentParser that only knows these args/actions. It is kept
+        # so that later calls with the same actions can reuse it.
+        arg_parser_key = (self.prefix_chars, tuple(user_config_file_arg_actions))
+        cached = getattr(self, '_config_path_arg_parser', None)
+        if cached is not None and cached[0] == arg_parser_key:
+            arg_parser = cached[1]
+        else:
             arg_parser = argparse.ArgumentParser(
                 prefix_chars=self.prefix_chars,
                 add_help=False)
 
-            arg_parser._add_action(action)
+            for action in user_config_file_arg_actions:
+                arg_parser._add_action(action)
 
             # make parser not exit on error by replacing its error method.
             # Otherwise it sys.exits(..) if, for example, config file
@@ -1234,12 +1431,15 @@ class ArgumentParser(argparse.ArgumentParser):
             def error_method(self, message):
                 pass
             arg_parser.error = types.MethodType(error_method, arg_parser)
+            self._config_path_arg_parser = (arg_parser_key, arg_parser)
 
-            # check whether the user provided a value
-            parsed_arg = arg_parser.parse_known_args(args=command_line_args)
-            if not parsed_arg:
-                continue
-            namespace, _ = parsed_arg
+        # check whether the user provided values
+        parsed_arg = arg_parser.parse_known_args(args=command_line_args)
+        if not parsed_arg:
+            return config_files
+        namespace, _ = parsed_arg
+
+        for action in user_config_file_arg_actions:
             user_config_file = getattr(namespace, action.dest, None)
 
             if not user_config_file:
@@ -1282,21 +1482,24 @@ class ArgumentParser(argparse.ArgumentParser):
             _DEFAULTS_SOURCE_KEY: "Defaults:\n"
         }
 
-        r = StringIO()
+        self._add_default_settings()
+        r = []
         for source, settings in self._source_to_settings.items(): #type:ignore[argument-error]
-            source = source.split("|")
-            source = source_key_to_display_value_map[source[0]] % tuple(source[1:])
-            r.write(source)
+            # only split off the source type, as the config file path itself
+            # may contain a "|"
+            source, sep, source_name = source.partition("|")
+            source = source_key_to_display_value_map[source]
+            r.append(source % source_name if sep else source)
             for key, (action, value) in settings.items():
                 if key:
-                    r.write("  {:<19}{}\n".format(key+":", value))
+                    r.append(f"  {key + ':':<19}{value}\n")
                 else:
                     if isinstance(value, str):
-                        r.write("  %s\n" % value)
+                        r.append(f"  {value}\n")
                     elif isinstance(value, list):
-                        r.write("  %s\n" % ' '.join(value))
+                        r.append(f"  {' '.join(value)}\n")
 
-        return r.getvalue()
+        return "".join(r)
 
     def print_values(self, file = sys.stdout):
         """Prints the format_values() string (to sys.stdout or another file)."""
@@ -1309,14 +1512,16 @@ class ArgumentParser(argparse.ArgumentParser):
         if self._add_config_file_help:
             default_config_files = self._default_config_files
             cc = 2*self.prefix_chars[0]  # eg. --
-            config_settable_args = [(arg, a) for a in self._actions for arg in
-                a.option_strings if self.get_possible_config_keys(a) and not
+            # only whether there are any is needed, so check each action once
+            # (rather than once per option string) and stop at the first one
+            has_config_settable_args = any(
+                a.option_strings and self.get_possible_config_keys(a) and not
                 (a.dest == "help" or a.is_config_file_arg or
-                 a.is_write_out_config_file_arg)]
+                 a.is_write_out_config_file_arg) for a in self._actions)
             config_path_actions = [a for a in
                 self._actions if getattr(a, "is_config_file_arg", False)]
 
-            if config_settable_args and (default_config_files or
+            if has_config_settable_args and (default_config_files or
                                          config_path_actions):
                 self._add_config_file_help = False  # prevent duplication
                 added_config_file_help = True
@@ -1387,13 +1592,14 @@ def add_argument(self, *args, **kwargs):
         argparse.Action: the new argparse action
     """
 
-    env_var = kwargs.pop("env_var", None)
+    pop = kwargs.pop
+    env_var = pop("env_var", None)
 
-    is_config_file_arg = kwargs.pop(
-        "is_config_file_arg", None) or kwargs.pop(
-        "is_config_file", None)  # for backward compat.
+    is_config_file_arg = pop("is_config_file_arg", None)
+    if not is_config_file_arg and "is_config_file" in kwargs:
+        is_config_file_arg = pop("is_config_file")  # for backward compat.
 
-    is_write_out_config_file_arg = kwargs.pop(
+    is_write_out_config_file_arg = pop(
         "is_write_out_config_file_arg", None)
 
     action = self.original_add_argument_method(*args, **kwargs)
@@ -1403,14 +1609,19 @@ def add_argument(self, *args, **kwargs):
     action.is_config_file_arg = is_config_file_arg
     action.is_write_out_config_file_arg = is_write_out_config_file_arg
 
+    # nothing to validate for plain argparse args (the common case)
+    if not (env_var or is_config_file_arg or is_write_out_config_file_arg):
+        return action
+
+    is_store_action = isinstance(action, argparse._StoreAction)
     if action.is_positional_arg and env_var:
         raise ValueError("env_var can't be set for a positional arg.")
-    if action.is_config_file_arg and not isinstance(action, argparse._StoreAction):
+    if action.is_config_file_arg and not is_store_action:
         raise ValueError("arg with is_config_file_arg=True must have "
                          "action='store'")
     if action.is_write_out_config_file_arg:
         error_prefix = "arg with is_write_out_config_file_arg=True "
-        if not isinstance(action, argparse._StoreAction):
+        if not is_store_action:
             raise ValueError(error_prefix + "must have action='store'")
         if is_config_file_arg:
                 raise ValueError(error_prefix + "can't also have "
@@ -1426,43 +1637,88 @@ def already_on_command_line(existing_args_list, potential_command_line_args, pre
     Returns:
         bool: already on command line?
     """
-    arg_names = []
+    arg_names = get_command_line_arg_names(existing_args_list, prefix_chars)
+    return not arg_names.isdisjoint(potential_command_line_args)
+
+
+def get_command_line_arg_names(existing_args_list, prefix_chars):
+    """Utility method for collecting the names of all args in existing_args,
+    with the value stripped off of any ``--key=value`` style args. Building
+    this once and testing it for membership is cheaper than calling
+    `already_on_command_line` repeatedly for the same args list.
+
+    Returns:
+        set[str]: arg names
+    """
+    arg_names = set()
     for arg_string in existing_args_list:
-        if arg_string and arg_string[0] in prefix_chars and "=" in arg_string :
-            option_string, explicit_arg = arg_string.split("=", 1)
-            arg_names.append(option_string)
-        else:
-            arg_names.append(arg_string)
+        if arg_string and arg_string[0] in prefix_chars:
+            # partition() doesn't build a list, and is a no-op without a "="
+            arg_string = arg_string.partition("=")[0]
+        arg_names.add(arg_string)
+
+    return arg_names
+
+
+def may_be_on_command_line(existing_args_list, potential_command_line_args, prefix_chars):
+    """Utility method for cheaply ruling out that any of the
+    potential_command_line_args was given in existing_args. Unlike
+    `already_on_command_line`, this also accounts for the forms argparse
+    accepts beyond the exact option string: abbreviations (eg. ``--conf``
+    for ``--config``) and values attached to short options (eg. ``-cfile``).
+
+    Returns:
+        bool: False if none of the args can be on the command line
+    """
+    # str.startswith() checks a whole tuple of prefixes in one call, which
+    # covers exact matches, "--key=value" and "-kvalue" args at once.
+    # Abbreviations are found with one substring search: an option string is
+    # a prefix of one of the args iff "\0" + it occurs in "\0arg1\0arg2...".
+    # (An option string that itself contains "\0" may give a false positive,
+    # which only costs the full parse this check is meant to skip.)
+    potential_command_line_args = tuple(potential_command_line_args)
+    joined_args = "\0" + "\0".join(potential_command_line_args)
+    for arg_string in existing_args_list:
+        if not arg_string or arg_string[0] not in prefix_chars:
+            continue
+        if arg_string.startswith(potential_command_line_args):
+            return True
+        if "\0" + arg_string.partition("=")[0] in joined_args:
+            return True
+
+    return False
 
-    return any(
-        potential_arg in arg_names for potential_arg in potential_command_line_args
-    )
 #TODO: Update to latest version of pydoctor when https://github.com/twisted/pydoctor/pull/414 has been merged 
 # such that the alises can be documented automatically.
 
 # wrap ArgumentParser's add_argument(..) method with the one above
-argparse._ActionsContainer.original_add_argument_method = argparse._ActionsContainer.add_argument
+# (only remember argparse's own method the first time, so that re-importing
+# this module doesn't wrap the wrapper)
+if not hasattr(argparse._ActionsContainer, "original_add_argument_method"):
+    argparse._ActionsContainer.original_add_argument_method = argparse._ActionsContainer.add_argument
 argparse._ActionsContainer.add_argument = add_argument
 
 
 # add all public classes and constants from argparse module's namespace to this
 # module's namespace so that the 2 modules are truly interchangeable
-Action = argparse.Action
-ArgumentDefaultsHelpFormatter = argparse.ArgumentDefaultsHelpFormatter
-ArgumentError = argparse.ArgumentError
-ArgumentTypeError = argparse.ArgumentTypeError
-FileType = argparse.FileType
-HelpFormatter = argparse.HelpFormatter
-MetavarTypeHelpFormatter = argparse.MetavarTypeHelpFormatter
-Namespace = argparse.Namespace
-RawDescriptionHelpFormatter = argparse.RawDescriptionHelpFormatter
-RawTextHelpFormatter = argparse.RawTextHelpFormatter
-ONE_OR_MORE = argparse.ONE_OR_MORE
-OPTIONAL = argparse.OPTIONAL
-PARSER = argparse.PARSER
-REMAINDER = argparse.REMAINDER
-SUPPRESS = argparse.SUPPRESS
-ZERO_OR_MORE = argparse.ZERO_OR_MORE
+from argparse import (
+    Action,
+    ArgumentDefaultsHelpFormatter,
+    ArgumentError,
+    ArgumentTypeError,
+    FileType,
+    HelpFormatter,
+    MetavarTypeHelpFormatter,
+    Namespace,
+    RawDescriptionHelpFormatter,
+    RawTextHelpFormatter,
+    ONE_OR_MORE,
+    OPTIONAL,
+    PARSER,
+    REMAINDER,
+    SUPPRESS,
+    ZERO_OR_MORE,
+)
 
 
 # deprecated PEP-8 incompatible API names.
@@ -1478,8 +1734,8 @@ get_parser = get_argument_parser
 ArgParser = ArgumentParser
 Parser = ArgumentParser
 
-argparse._ActionsContainer.add_arg = argparse._ActionsContainer.add_argument
-argparse._ActionsContainer.add = argparse._ActionsContainer.add_argument
+argparse._ActionsContainer.add_arg = add_argument
+argparse._ActionsContainer.add = add_argument
 
 ArgumentParser.parse = ArgumentParser.parse_args
 ArgumentParser.parse_known = ArgumentParser.parse_known_args
@@ -1,5 +1,6 @@
 import logging
 import os
+import subprocess
 import sys
 
 
@@ -25,14 +26,16 @@ def launch_http_server(directory):
 
         import socket
 
+        # probe for a free port with a single socket - a failed bind()
+        # leaves it unbound, so it can just be retried with the next port
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         for port in [80] + list(range(8000, 8100)):
             try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                s.bind(('localhost', port))
-                s.close()
+                probe.bind(('localhost', port))
             except socket.error as e:
                 logging.debug("Can't use port %d: %s" % (port, e.strerror))
                 continue
+            probe.close()
 
             print("HTML coverage report now available at http://{}{}".format(
                 socket.gethostname(), (":%s" % port) if port != 80 else ""))
@@ -41,6 +44,7 @@ def launch_http_server(directory):
             SocketServer.TCPServer(("", port),
                 SimpleHTTPRequestHandler).serve_forever()
         else:
+            probe.close()
             logging.debug("All network port. ")
     except Exception as e:
         logging.error("ERROR: while starting an HTTP server to serve "
@@ -57,20 +61,23 @@ if command == 'publish':
     sys.exit()
 elif command == "coverage":
     try:
-        import coverage
+        import coverage.cmdline
     except:
         sys.exit("coverage.py not installed (pip install --user coverage)")
     setup_py_path = os.path.abspath(__file__)
-    os.system('coverage run --source=configargparse ' + setup_py_path +' test')
-    os.system('coverage report')
-    os.system('coverage html')
+    subprocess.call([sys.executable, '-m', 'coverage', 'run',
+                     '--source=configargparse', setup_py_path, 'test'])
+    # the report commands only read the data file, so run them in-process
+    coverage.cmdline.main(['report'])
+    coverage.cmdline.main(['html'])
     print("Done computing coverage")
     launch_http_server(directory="htmlcov")
     sys.exit()
 
 long_description = ''
 if command not in ['test', 'coverage']:
-    long_description = open('README.rst').read()
+    with open('README.rst', encoding='utf-8') as f:
+        long_description = f.read()
 
 install_requires = []
 tests_require = [
@@ -1,9 +1,11 @@
 import argparse
 import configargparse
-from contextlib import contextmanager
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
 import inspect
+import itertools
 import logging
 import os
+import pickle
 import sys
 import tempfile
 import types
@@ -24,28 +26,51 @@ if sys.version_info >= (3, 10):
 else:
     OPTIONAL_ARGS_STRING="optional arguments"
 
-# set COLUMNS to get expected wrapping
+# env vars shared by the env var list tests. Read-only, which also checks that
+# parsing never modifies the env_vars mapping it is given.
+ENV_VAR_LISTS = types.MappingProxyType({
+    "TEST2": "22",
+    "TEST3": "22",
+    "TEST4": "[Shell, someword, anotherword]",
+    "TEST5": "[22, 99, 33]",
+    "TEST6": "[value6.1, value6.2, value6.3]",
+    "TEST7": "[value7.1, value7.2, value7.3]",
+})
+
+# a boolean --flag (that also gets a --no-flag where argparse supports it)
+if sys.version_info >= (3, 9):
+    BOOLEAN_FLAG_KWARGS = dict(action=argparse.BooleanOptionalAction, default=False)
+else:
+    BOOLEAN_FLAG_KWARGS = dict(action="store_true", default=False)
+
+# set COLUMNS to get expected wrapping. This is done once for the whole module
+# and deliberately overrides (rather than setdefault()s) the value inherited
+# from the terminal, which would otherwise change the expected help output.
 os.environ['COLUMNS'] = '80'
 
 # enable logging to simplify debugging
 logger = logging.getLogger()
 logger.level = logging.DEBUG
-stream_handler = logging.StreamHandler(sys.stdout)
-logger.addHandler(stream_handler)
+# don't stack up another handler (and print every record twice) if this
+# module gets imported more than once
+if not any(isinstance(h, logging.StreamHandler) and h.stream is sys.stdout
+           for h in logger.handlers):
+    stream_handler = logging.StreamHandler(sys.stdout)
+    logger.addHandler(stream_handler)
+
+def _error_method(self, message):
+    raise argparse.ArgumentError(None, message)
+
+def _exit_method(self, status, message=None):
+    self._exit_method_called = True
 
 def replace_error_method(arg_parser):
     """Swap out arg_parser's error(..) method so that instead of calling
     sys.exit(..) it just raises an error.
     """
-    def error_method(self, message):
-        raise argparse.ArgumentError(None, message)
-
-    def exit_method(self, status, message=None):
-        self._exit_method_called = True
-
     arg_parser._exit_method_called = False
-    arg_parser.error = types.MethodType(error_method, arg_parser)
-    arg_parser.exit = types.MethodType(exit_method, arg_parser)
+    arg_parser.error = _error_method.__get__(arg_parser)
+    arg_parser.exit = _exit_method.__get__(arg_parser)
 
     return arg_parser
 
@@ -56,32 +81,59 @@ def captured_output():
     swap stdout and stderr for StringIO so we can do asserts on outputs.
     """
     new_out, new_err = StringIO(), StringIO()
-    old_out, old_err = sys.stdout, sys.stderr
-    try:
-        sys.stdout, sys.stderr = new_out, new_err
-        yield sys.stdout, sys.stderr
-    finally:
-        sys.stdout, sys.stderr = old_out, old_err
+    with redirect_stdout(new_out), redirect_stderr(new_err):
+        yield new_out, new_err
 
 
 class TestCase(unittest.TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._tmp_dir = tempfile.TemporaryDirectory()
+        cls._tmp_file_counter = itertools.count()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp_dir.cleanup()
+        super().tearDownClass()
+
+    def tmpFile(self, mode="w"):
+        """Returns a new file, opened with the given mode, in a temporary
+        directory that is removed once all tests in the class have run.
+        """
+        path = os.path.join(self._tmp_dir.name,
+                            "tmp%d" % next(self._tmp_file_counter))
+        f = open(path, mode)
+        self.addCleanup(f.close)
+        return f
+
+    def inMemoryOpenFunc(self, files):
+        """Returns a config_file_open_func that opens the paths in the given
+        {path: contents} dict as in-memory streams, and any other path with
+        open(). The contents are read when a path is opened, so tests can
+        change them between parses.
+        """
+        def open_func(path, *args, **kwargs):
+            if path not in files:
+                return open(path, *args, **kwargs)
+            stream = StringIO(files[path])
+            stream.name = path
+            return stream
+        return open_func
+
     def initParser(self, *args, **kwargs):
         p = configargparse.ArgParser(*args, **kwargs)
         self.parser = replace_error_method(p)
-        self.add_arg = self.parser.add_argument
-        self.parse = self.parser.parse_args
-        self.parse_known = self.parser.parse_known_args
-        self.format_values = self.parser.format_values
-        self.format_help = self.parser.format_help
-
-        if not hasattr(self, "assertRegex"):
-            self.assertRegex = self.assertRegexpMatches
-        if not hasattr(self, "assertRaisesRegex"):
-            self.assertRaisesRegex = self.assertRaisesRegexp
-
         return self.parser
 
+    # shortcuts for the current parser's methods, looked up only when used
+    add_arg = property(lambda self: self.parser.add_argument)
+    parse = property(lambda self: self.parser.parse_args)
+    parse_known = property(lambda self: self.parser.parse_known_args)
+    format_values = property(lambda self: self.parser.format_values)
+    format_help = property(lambda self: self.parser.format_help)
+
     def assertParseArgsRaises(self, regex, args, **kwargs):
         self.assertRaisesRegex(argparse.ArgumentError, regex, self.parse,
                                args=args, **kwargs)
@@ -97,10 +149,7 @@ class TestBasicUseCases(TestCase):
         self.add_arg("-x", "--arg-x", action="store_true")
         self.add_arg("-y", "--arg-y", dest="y1", type=int, required=True)
         self.add_arg("--arg-z", action="append", type=float, required=True)
-        if sys.version_info >= (3, 9):
-            self.add_arg('--foo', action=argparse.BooleanOptionalAction, default=False)
-        else:
-            self.add_arg('--foo', action="store_true", default=False)
+        self.add_arg('--foo', **BOOLEAN_FLAG_KWARGS)
 
         # make sure required args are enforced
         self.assertParseArgsRaises("too few arg"
@@ -157,47 +206,43 @@ class TestBasicUseCases(TestCase):
                                     foo = True
                                  """)
         self.format_help()
-        self.format_values()
+        values = self.format_values()
         self.assertListEqual(ns.filenames, ["file1.txt", "file2.txt"])
         self.assertEqual(ns.arg_x, True)
         self.assertEqual(ns.y1, 3)
         self.assertEqual(ns.arg_z, [100])
         self.assertEqual(ns.foo, True)
 
-        self.assertRegex(self.format_values(),
+        self.assertRegex(values,
             "Command Line Args:   file1.txt file2.txt --arg-x -y 3 --arg-z 100")
 
     def testBasicCase2(self, use_groups=False):
 
         ## Test command line, config file and env var values
-        default_config_file = tempfile.NamedTemporaryFile(mode="w", delete=False)
+        default_config_file = self.tmpFile()
         default_config_file.flush()
 
+        config_files = {}
         p = self.initParser(default_config_files=['/etc/settings.ini',
-                '/home/jeff/.user_settings', default_config_file.name])
+                '/home/jeff/.user_settings', default_config_file.name],
+                config_file_open_func=self.inMemoryOpenFunc(config_files))
         p.add_arg('vcf', nargs='+', help='Variant file(s)')
-        if not use_groups:
-            self.add_arg('--genome', help='Path to genome file', required=True)
-            self.add_arg('-v', dest='verbose', action='store_true')
-            self.add_arg('-g', '--my-cfg-file', required=True,
-                         is_config_file=True)
-            self.add_arg('-d', '--dbsnp', env_var='DBSNP_PATH')
-            self.add_arg('-f', '--format',
-                         choices=["BED", "MAF", "VCF", "WIG", "R"],
-                         dest="fmt", metavar="FRMT", env_var="OUTPUT_FORMAT",
-                         default="BED")
-        else:
-            g = p.add_argument_group(title="g1")
-            g.add_arg('--genome', help='Path to genome file', required=True)
-            g.add_arg('-v', dest='verbose', action='store_true')
-            g.add_arg('-g', '--my-cfg-file', required=True,
-                      is_config_file=True)
-            g = p.add_argument_group(title="g2")
-            g.add_arg('-d', '--dbsnp', env_var='DBSNP_PATH')
-            g.add_arg('-f', '--format',
-                      choices=["BED", "MAF", "VCF", "WIG", "R"],
-                      dest="fmt", metavar="FRMT", env_var="OUTPUT_FORMAT",
-                      default="BED")
+        # the same args either go straight into the parser, or into 2 groups
+        groups = {}
+        for group_title, option_strings, kwargs in [
+            ("g1", ['--genome'], dict(help='Path to genome file', required=True)),
+            ("g1", ['-v'], dict(dest='verbose', action='store_true')),
+            ("g1", ['-g', '--my-cfg-file'], dict(required=True,
+                                                 is_config_file=True)),
+            ("g2", ['-d', '--dbsnp'], dict(env_var='DBSNP_PATH')),
+            ("g2", ['-f', '--format'], dict(
+                choices=["BED", "MAF", "VCF", "WIG", "R"],
+                dest="fmt", metavar="FRMT", env_var="OUTPUT_FORMAT",
+                default="BED")),
+        ]:
+            if use_groups and group_title not in groups:
+                groups[group_title] = p.add_argument_group(title=group_title)
+            groups.get(group_title, p).add_arg(*option_strings, **kwargs)
 
         # make sure required args are enforced
         self.assertParseArgsRaises("too few arg"
@@ -207,10 +252,10 @@ class TestBasicUseCases(TestCase):
         self.assertParseArgsRaises("Unable to open config file: file.txt. Error: No such file or director", args="-g file.txt")
 
         # check values after setting args on command line
-        config_file2 = tempfile.NamedTemporaryFile(mode="w", delete=False)
-        config_file2.flush()
+        config_file2 = "/mem/config_file2.ini"
+        config_files[config_file2] = ""
 
-        ns = self.parse(args="--genome hg19 -g %s bla.vcf " % config_file2.name)
+        ns = self.parse(args="--genome hg19 -g %s bla.vcf " % config_file2)
         self.assertEqual(ns.genome, "hg19")
         self.assertEqual(ns.verbose, False)
         self.assertIsNone(ns.dbsnp)
@@ -225,41 +270,36 @@ class TestBasicUseCases(TestCase):
         # check precedence: args > env > config > default using the --format arg
         default_config_file.write("--format MAF")
         default_config_file.flush()
-        ns = self.parse(args="--genome hg19 -g %s f.vcf " % config_file2.name)
-        self.assertEqual(ns.fmt, "MAF")
-        self.assertRegex(self.format_values(),
-            'Command Line Args:   --genome hg19 -g [^\\s]+ f.vcf\n'
-            'Config File \\([^\\s]+\\):\n'
-            '  --format: \\s+ MAF\n')
-
-        config_file2.write("--format VCF")
-        config_file2.flush()
-        ns = self.parse(args="--genome hg19 -g %s f.vcf " % config_file2.name)
-        self.assertEqual(ns.fmt, "VCF")
-        self.assertRegex(self.format_values(),
-            'Command Line Args:   --genome hg19 -g [^\\s]+ f.vcf\n'
-            'Config File \\([^\\s]+\\):\n'
-            '  --format: \\s+ VCF\n')
-
-        ns = self.parse(env_vars={"OUTPUT_FORMAT":"R", "DBSNP_PATH":"/a/b.vcf"},
-            args="--genome hg19 -g %s f.vcf " % config_file2.name)
-        self.assertEqual(ns.fmt, "R")
-        self.assertEqual(ns.dbsnp, "/a/b.vcf")
-        self.assertRegex(self.format_values(),
-            'Command Line Args:   --genome hg19 -g [^\\s]+ f.vcf\n'
-            'Environment Variables:\n'
-            '  DBSNP_PATH: \\s+ /a/b.vcf\n'
-            '  OUTPUT_FORMAT: \\s+ R\n')
-
-        ns = self.parse(env_vars={"OUTPUT_FORMAT":"R", "DBSNP_PATH":"/a/b.vcf",
-                                  "ANOTHER_VAR":"something"},
-            args="--genome hg19 -g %s --format WIG f.vcf" % config_file2.name)
-        self.assertEqual(ns.fmt, "WIG")
-        self.assertEqual(ns.dbsnp, "/a/b.vcf")
-        self.assertRegex(self.format_values(),
-            'Command Line Args:   --genome hg19 -g [^\\s]+ --format WIG f.vcf\n'
-            'Environment Variables:\n'
-            '  DBSNP_PATH: \\s+ /a/b.vcf\n')
+        env_vars = {"OUTPUT_FORMAT":"R", "DBSNP_PATH":"/a/b.vcf"}
+        precedence_cases = [
+            # (config_file2 contents, env vars, args, expected fmt,
+            #  expected dbsnp, expected format_values() regex)
+            ("", os.environ, "--genome hg19 -g %s f.vcf ", "MAF", None,
+                'Command Line Args:   --genome hg19 -g [^\\s]+ f.vcf\n'
+                'Config File \\([^\\s]+\\):\n'
+                '  --format: \\s+ MAF\n'),
+            ("--format VCF", os.environ, "--genome hg19 -g %s f.vcf ", "VCF", None,
+                'Command Line Args:   --genome hg19 -g [^\\s]+ f.vcf\n'
+                'Config File \\([^\\s]+\\):\n'
+                '  --format: \\s+ VCF\n'),
+            ("--format VCF", env_vars, "--genome hg19 -g %s f.vcf ", "R", "/a/b.vcf",
+                'Command Line Args:   --genome hg19 -g [^\\s]+ f.vcf\n'
+                'Environment Variables:\n'
+                '  DBSNP_PATH: \\s+ /a/b.vcf\n'
+                '  OUTPUT_FORMAT: \\s+ R\n'),
+            ("--format VCF", dict(env_vars, ANOTHER_VAR="something"),
+                "--genome hg19 -g %s --format WIG f.vcf", "WIG", "/a/b.vcf",
+                'Command Line Args:   --genome hg19 -g [^\\s]+ --format WIG f.vcf\n'
+                'Environment Variables:\n'
+                '  DBSNP_PATH: \\s+ /a/b.vcf\n'),
+        ]
+        for config2_contents, case_env_vars, args, fmt, dbsnp, values_regex in precedence_cases:
+            with self.subTest(fmt=fmt):
+                config_files[config_file2] = config2_contents
+                ns = self.parse(env_vars=case_env_vars, args=args % config_file2)
+                self.assertEqual(ns.fmt, fmt)
+                self.assertEqual(ns.dbsnp, dbsnp)
+                self.assertRegex(self.format_values(), values_regex)
 
         if not use_groups:
             self.assertRegex(self.format_help(),
@@ -293,12 +333,9 @@ class TestBasicUseCases(TestCase):
                 7*r'(.+\s*)')
 
         self.assertParseArgsRaises("invalid choice: 'ZZZ'",
-            args="--genome hg19 -g %s --format ZZZ f.vcf" % config_file2.name)
+            args="--genome hg19 -g %s --format ZZZ f.vcf" % config_file2)
         self.assertParseArgsRaises("unrecognized arguments: --bla",
-            args="--bla --genome hg19 -g %s f.vcf" % config_file2.name)
-
-        default_config_file.close()
-        config_file2.close()
+            args="--bla --genome hg19 -g %s f.vcf" % config_file2)
 
 
     def testBasicCase2_WithGroups(self):
@@ -307,20 +344,18 @@ class TestBasicUseCases(TestCase):
     def testCustomOpenFunction(self):
         expected_output = 'dummy open called'
 
+        in_memory_open = self.inMemoryOpenFunc({'/mem/config.ini': 'arg1 2'})
+
         def dummy_open(p):
             print(expected_output)
-            return open(p)
+            return in_memory_open(p)
 
         self.initParser(config_file_open_func=dummy_open)
         self.add_arg('--config', is_config_file=True)
         self.add_arg('--arg1', default=1, type=int)
 
-        with tempfile.NamedTemporaryFile(mode='w', delete=False) as config_file:
-            config_file.write('arg1 2')
-            config_file_path = config_file.name
-
         with captured_output() as (out, _):
-            args = self.parse('--config {}'.format(config_file_path))
+            args = self.parse('--config /mem/config.ini')
             self.assertTrue(hasattr(args, 'arg1'))
             self.assertEqual(args.arg1, 2)
             output = out.getvalue().strip()
@@ -334,7 +369,10 @@ class TestBasicUseCases(TestCase):
         self.add_arg('--arg2')
         args, _ = self.parse_known('--arg2 3 --help', ignore_help_args=True)
         self.assertEqual(args.arg2, "3")
-        self.assertRaisesRegex(TypeError, "exit", self.parse_known, '--arg2 3 --help', ignore_help_args=False)
+        help_output = StringIO()
+        with redirect_stdout(help_output):
+            self.assertRaisesRegex(TypeError, "exit", self.parse_known, '--arg2 3 --help', ignore_help_args=False)
+        self.assertTrue(help_output.getvalue().startswith("usage"))
 
     def testPositionalAndConfigVarLists(self):
         self.initParser()
@@ -347,9 +385,9 @@ class TestBasicUseCases(TestCase):
         self.assertEqual(ns.a, "positional_value")
 
     def testMutuallyExclusiveArgs(self):
-        config_file = tempfile.NamedTemporaryFile(mode="w", delete=False)
-
-        p = self.parser
+        config_file = "/mem/type1.ini"
+        p = self.initParser(args_for_setting_config_path=[],
+            config_file_open_func=self.inMemoryOpenFunc({config_file: ""}))
         g = p.add_argument_group(title="group1")
         g.add_arg('--genome', help='Path to genome file', required=True)
         g.add_arg('-v', dest='verbose', action='store_true')
@@ -365,13 +403,13 @@ class TestBasicUseCases(TestCase):
         g.add_arg('-b', '--bam', dest='fmt', action="store_const", const="BAM",
                   env_var='BAM_FORMAT')
 
-        ns = self.parse(args="--genome hg19 -f1 %s --bam" % config_file.name)
+        ns = self.parse(args="--genome hg19 -f1 %s --bam" % config_file)
         self.assertEqual(ns.genome, "hg19")
         self.assertEqual(ns.verbose, False)
         self.assertEqual(ns.fmt, "BAM")
 
         ns = self.parse(env_vars={"BAM_FORMAT" : "true"},
-                        args="--genome hg19 -f1 %s" % config_file.name)
+                        args="--genome hg19 -f1 %s" % config_file)
         self.assertEqual(ns.genome, "hg19")
         self.assertEqual(ns.verbose, False)
         self.assertEqual(ns.fmt, "BAM")
@@ -395,16 +433,12 @@ class TestBasicUseCases(TestCase):
             '  --genome GENOME       Path to genome file\n'
             '  -v\n\n'%OPTIONAL_ARGS_STRING +
             5*r'(.+\s*)')
-        config_file.close()
 
     def testSubParsers(self):
-        config_file1 = tempfile.NamedTemporaryFile(mode="w", delete=False)
-        config_file1.write("--i = B")
-        config_file1.flush()
-
-        config_file2 = tempfile.NamedTemporaryFile(mode="w", delete=False)
-        config_file2.write("p = 10")
-        config_file2.flush()
+        open_func = self.inMemoryOpenFunc({
+            "/mem/config_file1.ini": "--i = B",
+            "/mem/config_file2.ini": "p = 10",
+        })
 
         parser = configargparse.ArgumentParser(prog="myProg")
         subparsers = parser.add_subparsers(title="actions")
@@ -414,24 +448,24 @@ class TestBasicUseCases(TestCase):
                                    help="set db parameter")
 
         create_p = subparsers.add_parser("create", parents=[parent_parser],
-                                         help="create the orbix environment")
+                                         help="create the orbix environment",
+                                         config_file_open_func=open_func)
         create_p.add_argument("--i", env_var="INIT", choices=["A","B"],
                               default="A")
         create_p.add_argument("-config", is_config_file=True)
 
 
         update_p = subparsers.add_parser("update", parents=[parent_parser],
-                                         help="update the orbix environment")
+                                         help="update the orbix environment",
+                                         config_file_open_func=open_func)
         update_p.add_argument("-config2", is_config_file=True, required=True)
 
-        ns = parser.parse_args(args = "create -p 2 -config "+config_file1.name)
+        ns = parser.parse_args(args = "create -p 2 -config /mem/config_file1.ini")
         self.assertEqual(ns.p, 2)
         self.assertEqual(ns.i, "B")
 
-        ns = parser.parse_args(args = "update -config2 " + config_file2.name)
+        ns = parser.parse_args(args = "update -config2 /mem/config_file2.ini")
         self.assertEqual(ns.p, 10)
-        config_file1.close()
-        config_file2.close()
 
     def testAddArgsErrors(self):
         self.assertRaisesRegex(ValueError, "arg with "
@@ -539,13 +573,8 @@ class TestBasicUseCases(TestCase):
 
     def testQuotedArgumentValues(self):
         self.initParser()
-        self.add_arg("-a")
-        self.add_arg("--b")
-        self.add_arg("-c")
-        self.add_arg("--d")
-        self.add_arg("-e")
-        self.add_arg("-q")
-        self.add_arg("--quotes")
+        for option_string in ("-a", "--b", "-c", "--d", "-e", "-q", "--quotes"):
+            self.add_arg(option_string)
 
         # sys.argv equivalent of -a="1"  --b "1" -c= --d "" -e=: -q "\"'" --quotes "\"'"
         ns = self.parse(args=['-a=1', '--b', '1', '-c=', '--d', '', '-e=:',
@@ -577,37 +606,18 @@ class TestBasicUseCases(TestCase):
         self.assertEqual(ns.c, "")
 
     def testBooleanValuesCanBeExpressedAsNumbers(self):
-        self.initParser()
-        store_true_env_var_name = "STORE_TRUE"
-        self.add_arg("--boolean_store_true", action="store_true", env_var=store_true_env_var_name)
-
-        result_namespace = self.parse("", config_file_contents="""boolean_store_true = 1""")
-        self.assertTrue(result_namespace.boolean_store_true)
-
-        result_namespace = self.parse("", config_file_contents="""boolean_store_true = 0""")
-        self.assertFalse(result_namespace.boolean_store_true)
-
-        result_namespace = self.parse("", env_vars={store_true_env_var_name: "1"})
-        self.assertTrue(result_namespace.boolean_store_true)
-
-        result_namespace = self.parse("", env_vars={store_true_env_var_name: "0"})
-        self.assertFalse(result_namespace.boolean_store_true)
-
-        self.initParser()
-        store_false_env_var_name = "STORE_FALSE"
-        self.add_arg("--boolean_store_false", action="store_false", env_var=store_false_env_var_name)
-
-        result_namespace = self.parse("", config_file_contents="""boolean_store_false = 1""")
-        self.assertFalse(result_namespace.boolean_store_false)
-
-        result_namespace = self.parse("", config_file_contents="""boolean_store_false = 0""")
-        self.assertTrue(result_namespace.boolean_store_false)
-
-        result_namespace = self.parse("", env_vars={store_false_env_var_name: "1"})
-        self.assertFalse(result_namespace.boolean_store_false)
-
-        result_namespace = self.parse("", env_vars={store_false_env_var_name: "0"})
-        self.assertTrue(result_namespace.boolean_store_false)
+        # "1" sets the flag, "0" leaves it at its default
+        for action, value_if_set in [("store_true", True), ("store_false", False)]:
+            with self.subTest(action=action):
+                self.initParser()
+                self.add_arg("--boolean_flag", action=action, env_var="BOOLEAN_FLAG")
+                for value, expected in [("1", value_if_set), ("0", not value_if_set)]:
+                    ns = self.parse("", env_vars={},
+                                    config_file_contents="boolean_flag = " + value)
+                    self.assertIs(ns.boolean_flag, expected)
+
+                    ns = self.parse("", env_vars={"BOOLEAN_FLAG": value})
+                    self.assertIs(ns.boolean_flag, expected)
 
     def testConfigOrEnvValueErrors(self):
         # error should occur when a flag arg is set to something other than "true" or "false"
@@ -737,6 +747,21 @@ class TestBasicUseCases(TestCase):
         self.assertEqual(ns.arg4, "arg4_value")
         self.assertEqual(ns.arg4_more, "magic")
 
+    def testAutoEnvVarPrefix_ArgsAddedAfterParse(self):
+        self.initParser(auto_env_var_prefix="TEST_")
+        self.add_arg("--arg0")
+        env_vars = {"TEST_ARG0": "0", "TEST_ARG1": "1", "TEST_ARG2": "2"}
+        ns = self.parse("", env_vars=env_vars)
+        self.assertEqual(ns.arg0, "0")
+
+        self.add_arg("--arg1")
+        g = self.parser.add_argument_group(title="group")
+        g.add_arg("--arg2")
+        ns = self.parse("", env_vars=env_vars)
+        self.assertEqual(ns.arg0, "0")
+        self.assertEqual(ns.arg1, "1")
+        self.assertEqual(ns.arg2, "2")
+
     def testEnvVarLists(self):
         self.initParser()
         self.add_arg("-x", "--arg2", env_var="TEST2")
@@ -745,13 +770,7 @@ class TestBasicUseCases(TestCase):
         self.add_arg("-u", "--arg5", env_var="TEST5", nargs="+", type=int)
         self.add_arg("--arg6", env_var="TEST6")
         self.add_arg("--arg7", env_var="TEST7", action="append")
-        ns = self.parse("", env_vars={"TEST2": "22",
-                                      "TEST3": "22",
-                                      "TEST4": "[Shell, someword, anotherword]",
-                                      "TEST5": "[22, 99, 33]",
-                                      "TEST6": "[value6.1, value6.2, value6.3]",
-                                      "TEST7": "[value7.1, value7.2, value7.3]",
-                                      })
+        ns = self.parse("", env_vars=ENV_VAR_LISTS)
         self.assertEqual(ns.arg2, "22")
         self.assertEqual(ns.arg3, 22)
         self.assertEqual(ns.arg4, ['Shell', 'someword', 'anotherword'])
@@ -764,7 +783,7 @@ class TestBasicUseCases(TestCase):
         self.add_arg("a")
         self.add_arg("-x", "--arg", env_var="TEST", nargs="+")
 
-        ns = self.parse("positional_value", env_vars={"TEST": "[Shell, someword, anotherword]"})
+        ns = self.parse("positional_value", env_vars={"TEST": ENV_VAR_LISTS["TEST4"]})
 
         self.assertEqual(ns.arg, ['Shell', 'someword', 'anotherword'])
         self.assertEqual(ns.a, "positional_value")
@@ -835,11 +854,11 @@ class TestMisc(TestCase):
         self.add_arg("--x", required=True)
 
         # verify parsing from config file
-        config_file = tempfile.NamedTemporaryFile(mode="w", delete=False)
+        config_file = self.tmpFile()
         config_file.write("x=bla")
         config_file.flush()
 
-        ns = self.parse(args="-c %s" % config_file.name)
+        ns = self.parse(args=["-c", config_file.name])
         self.assertEqual(ns.x, "bla")
 
     def testConstructor_ConfigFileArgs(self):
@@ -847,28 +866,31 @@ class TestMisc(TestCase):
         #   args_for_setting_config_path
         #   config_arg_is_required
         #   config_arg_help_message
-        temp_cfg = tempfile.NamedTemporaryFile(mode="w", delete=False)
+        # default config files are looked up with glob, so this one has to
+        # be on disk
+        temp_cfg = self.tmpFile()
         temp_cfg.write("genome=hg19")
         temp_cfg.flush()
+        temp_cfg2 = "/mem/temp_cfg2.ini"
+        config_files = {temp_cfg2: ""}
 
         self.initParser(args_for_setting_config_path=["-c", "--config"],
                         config_arg_is_required = True,
                         config_arg_help_message = "my config file",
-                        default_config_files=[temp_cfg.name])
+                        default_config_files=[temp_cfg.name],
+                        config_file_open_func=self.inMemoryOpenFunc(config_files))
         self.add_arg('--genome', help='Path to genome file', required=True)
         self.assertParseArgsRaises("argument -c/--config is required"
                                    if sys.version_info.major < 3 else
                                    "arguments are required: -c/--config",
                                    args="")
 
-        temp_cfg2 = tempfile.NamedTemporaryFile(mode="w", delete=False)
-        ns = self.parse("-c " + temp_cfg2.name)
+        ns = self.parse(["-c", temp_cfg2])
         self.assertEqual(ns.genome, "hg19")
 
         # temp_cfg2 config file should override default config file values
-        temp_cfg2.write("genome=hg20")
-        temp_cfg2.flush()
-        ns = self.parse("-c " + temp_cfg2.name)
+        config_files[temp_cfg2] = "genome=hg20"
+        ns = self.parse(["-c", temp_cfg2])
         self.assertEqual(ns.genome, "hg20")
 
         self.assertRegex(self.format_help(),
@@ -902,19 +924,16 @@ class TestMisc(TestCase):
         """Tests that abbreviated values don't get pulled from config file.
 
         """
-        temp_cfg = tempfile.NamedTemporaryFile(mode="w", delete=False)
-        temp_cfg.write("a2a = 0.5\n")
-        temp_cfg.write("a3a = 0.5\n")
-        temp_cfg.flush()
-
-        self.initParser()
+        temp_cfg = "/mem/temp_cfg.ini"
+        self.initParser(config_file_open_func=self.inMemoryOpenFunc({
+            temp_cfg: "a2a = 0.5\na3a = 0.5\n"}))
 
         self.add_arg('-c', '--config_file', required=False, is_config_file=True,
                      help='config file path')
 
         self.add_arg('--hello', type=int, required=False)
 
-        command = '-c {} --hello 2'.format(temp_cfg.name)
+        command = ['-c', temp_cfg, '--hello', '2']
 
         known, unknown = self.parse_known(command)
 
@@ -946,7 +965,7 @@ class TestMisc(TestCase):
             r'Config file syntax allows: key=value, flag=true, stuff=\[a,b,c\] '
             r'\(for details, see syntax at https://goo.gl/R74nmi\). '
             r'In general, command-line values override config file values '
-            r'which override defaults. '.replace(' ', '\s*') % OPTIONAL_ARGS_STRING
+            r'which override defaults. '.replace(' ', r'\s*') % OPTIONAL_ARGS_STRING
         )
 
     def test_FormatHelpProg(self):
@@ -973,7 +992,7 @@ class TestMisc(TestCase):
         # Test constructor args:
         #   args_for_writing_out_config_file
         #   write_out_config_file_arg_help_message
-        cfg_f = tempfile.NamedTemporaryFile(mode="w+", delete=False)
+        cfg_f = self.tmpFile("w+")
         self.initParser(args_for_writing_out_config_file=["-w"],
                         write_out_config_file_arg_help_message="write config")
 
@@ -986,11 +1005,11 @@ class TestMisc(TestCase):
         self.add_arg("-l", "--config-file-settable-list", action="append")
 
         # write out a config file
-        command_line_args = "-w %s " % cfg_f.name
-        command_line_args += "--config-file-settable-arg 1 "
-        command_line_args += "--config-file-settable-flag "
-        command_line_args += "--config-file-settable-custom custom_value "
-        command_line_args += "-l a -l b -l c -l d "
+        command_line_args = ["-w", cfg_f.name]
+        command_line_args += ["--config-file-settable-arg", "1"]
+        command_line_args += ["--config-file-settable-flag"]
+        command_line_args += ["--config-file-settable-custom", "custom_value"]
+        command_line_args += ["-l", "a", "-l", "b", "-l", "c", "-l", "d"]
 
         self.assertFalse(self.parser._exit_method_called)
 
@@ -1007,14 +1026,13 @@ class TestMisc(TestCase):
         self.assertEqual(cfg_f.read().strip(),
             expected_config_file_contents.strip())
         self.assertRaisesRegex(ValueError, "Couldn't open / for writing:",
-            self.parse, args = command_line_args + " -w /")
-        cfg_f.close()
+            self.parse, args = command_line_args + ["-w", "/"])
 
     def testConstructor_WriteOutConfigFileArgs2(self):
         # Test constructor args:
         #   args_for_writing_out_config_file
         #   write_out_config_file_arg_help_message
-        cfg_f = tempfile.NamedTemporaryFile(mode="w+", delete=False)
+        cfg_f = self.tmpFile("w+")
         self.initParser(args_for_writing_out_config_file=["-w"],
                         write_out_config_file_arg_help_message="write config")
 
@@ -1030,8 +1048,8 @@ class TestMisc(TestCase):
         self.add_arg("-l", "--config-file-settable-list", action="append")
 
         # write out a config file
-        command_line_args = "-w %s " % cfg_f.name
-        command_line_args += "-l a -l b -l c -l d "
+        command_line_args = ["-w", cfg_f.name]
+        command_line_args += ["-l", "a", "-l", "b", "-l", "c", "-l", "d"]
 
         self.assertFalse(self.parser._exit_method_called)
 
@@ -1052,8 +1070,7 @@ class TestMisc(TestCase):
         self.assertEqual(cfg_f.read().strip(),
                          expected_config_file_contents.strip())
         self.assertRaisesRegex(ValueError, "Couldn't open / for writing:",
-                                self.parse, args = command_line_args + " -w /")
-        cfg_f.close()
+                                self.parse, args = command_line_args + ["-w", "/"])
 
     def testConstructor_WriteOutConfigFileArgsLong(self):
         """Test config writing with long version of arg
@@ -1065,7 +1082,7 @@ class TestMisc(TestCase):
         # Test constructor args:
         #   args_for_writing_out_config_file
         #   write_out_config_file_arg_help_message
-        cfg_f = tempfile.NamedTemporaryFile(mode="w+", delete=False)
+        cfg_f = self.tmpFile("w+")
         self.initParser(args_for_writing_out_config_file=["--write-config"],
                         write_out_config_file_arg_help_message="write config")
 
@@ -1077,10 +1094,10 @@ class TestMisc(TestCase):
         self.add_arg("-l", "--config-file-settable-list", action="append")
 
         # write out a config file
-        command_line_args = "--write-config %s " % cfg_f.name
-        command_line_args += "--config-file-settable-arg 1 "
-        command_line_args += "--config-file-settable-flag "
-        command_line_args += "-l a -l b -l c -l d "
+        command_line_args = ["--write-config", cfg_f.name]
+        command_line_args += ["--config-file-settable-arg", "1"]
+        command_line_args += ["--config-file-settable-flag"]
+        command_line_args += ["-l", "a", "-l", "b", "-l", "c", "-l", "d"]
 
         self.assertFalse(self.parser._exit_method_called)
 
@@ -1096,8 +1113,7 @@ class TestMisc(TestCase):
         self.assertEqual(cfg_f.read().strip(),
             expected_config_file_contents.strip())
         self.assertRaisesRegex(ValueError, "Couldn't open / for writing:",
-            self.parse, args = command_line_args + " --write-config /")
-        cfg_f.close()
+            self.parse, args = command_line_args + ["--write-config", "/"])
 
     def testMethodAliases(self):
         p = self.parser
@@ -1140,6 +1156,242 @@ class TestMisc(TestCase):
         self.parser.add_argument('-g', is_config_file=True)
         self.assertParseArgsRaises("Unable to open config file: file.txt. Error: custom error", args="-g file.txt")
 
+    def testPossibleConfigKeysFollowConflictResolution(self):
+        self.initParser(conflict_handler="resolve")
+        action = self.add_arg("--a", "--b")
+        self.assertListEqual(self.parser.get_possible_config_keys(action),
+                             ["a", "--a", "b", "--b"])
+        # --b is taken away from the first action
+        self.add_arg("--b")
+        self.assertListEqual(self.parser.get_possible_config_keys(action),
+                             ["a", "--a"])
+        ns = self.parse(args="", config_file_contents="a = 1\nb = 2")
+        self.assertEqual(ns.a, "1")
+        self.assertEqual(ns.b, "2")
+
+    def testPossibleConfigKeysCanBeExtended(self):
+        class ExtraKeyArgParser(configargparse.ArgParser):
+            def get_possible_config_keys(self, action):
+                keys = super().get_possible_config_keys(action)
+                keys.append(action.dest.upper())
+                return keys
+
+        p = ExtraKeyArgParser()
+        action = p.add_argument("--foo-bar")
+        for _ in range(3):
+            self.assertListEqual(p.get_possible_config_keys(action),
+                                 ["foo-bar", "--foo-bar", "FOO_BAR"])
+
+    def testSourceToSettingsDict(self):
+        action_a = self.add_arg("--a", default="1")
+        action_b = self.add_arg("--b", default="2", env_var="B")
+        self.add_arg("--c", default="3")
+        self.parse(args="--c 5", env_vars={"B": "4"})
+
+        self.assertDictEqual(self.parser.get_source_to_settings_dict(), {
+            "command_line": {"": (None, ["--c", "5"])},
+            "environment_variables": {"B": (action_b, "4")},
+            "defaults": {"--a": (action_a, "1")},
+        })
+        # defaults are only added once
+        self.format_values()
+        self.assertEqual(
+            list(self.parser.get_source_to_settings_dict()),
+            ["command_line", "environment_variables", "defaults"])
+
+    def testDefaultSettingsAreCapturedAtParseTime(self):
+        self.add_arg("--q", default=1)
+        self.parse(args=[])
+        # changes made after parsing don't show up in the reported defaults
+        self.parser.set_defaults(q=2)
+        self.add_arg("--r", default=5)
+        self.assertEqual(self.format_values(), "Defaults:\n  --q:               1\n")
+
+    def testFormatValuesConfigFilePathWithPipe(self):
+        config_file = "/mem/a|b.ini"
+        self.initParser(config_file_open_func=self.inMemoryOpenFunc(
+            {config_file: "x = 1"}))
+        self.add_arg("-c", is_config_file=True)
+        self.add_arg("--x")
+        self.parse(args=["-c", config_file])
+        self.assertIn("Config File (/mem/a|b.ini):\n  x:", self.format_values())
+
+        # a config source with an empty name still gets the name filled in
+        def open_unnamed(path):
+            stream = StringIO("x = 1")
+            stream.name = ""
+            return stream
+        self.initParser(config_file_open_func=open_unnamed)
+        self.add_arg("-c", is_config_file=True)
+        self.add_arg("--x")
+        self.parse(args=["-c", "unnamed.ini"])
+        self.assertIn("Config File ():\n  x:", self.format_values())
+
+    def testAlreadyOnCommandLine(self):
+        args = ["-x", "--arg-y=3", "positional", "--arg-z", "a=b"]
+        self.assertSetEqual(
+            configargparse.get_command_line_arg_names(args, "-"),
+            {"-x", "--arg-y", "positional", "--arg-z", "a=b"})
+        self.assertTrue(configargparse.already_on_command_line(
+            args, ["-y", "--arg-y"], "-"))
+        self.assertTrue(configargparse.already_on_command_line(
+            args, ["--arg-z"], "-"))
+        self.assertFalse(configargparse.already_on_command_line(
+            args, ["-a", "a"], "-"))
+
+    def testMayBeOnCommandLine(self):
+        for args, expected in [
+                (["--config", "a.ini"], True),
+                (["--config=a.ini"], True),
+                (["-ca.ini"], True),
+                (["--conf", "a.ini"], True),  # abbreviation
+                (["--conf=a.ini"], True),
+                (["--cfg", "a.ini"], False),
+                (["--other", "--config"], True),
+                (["config", "-x"], False),
+                ([], False)]:
+            with self.subTest(args=args):
+                self.assertEqual(configargparse.may_be_on_command_line(
+                    args, ["-c", "--config"], "-"), expected)
+
+    def testConfigFileArgForms(self):
+        path = "/mem/config.ini"
+        open_func = self.inMemoryOpenFunc({path: "x = 1"})
+
+        self.initParser(config_file_open_func=open_func)
+        self.add_arg("-c", "--config", is_config_file=True)
+        self.add_arg("--x")
+        for args in [["-c", path], ["-c" + path], ["--config", path],
+                     ["--config=" + path], ["--conf", path], ["--conf=" + path]]:
+            ns = self.parse(args=args)
+            self.assertEqual(ns.x, "1", msg=args)
+        ns = self.parse(args="")
+        self.assertIsNone(ns.x)
+
+        # a default config file path is used even if the arg isn't given
+        self.initParser(config_file_open_func=open_func)
+        self.add_arg("-c", "--config", is_config_file=True, default=path)
+        self.add_arg("--x")
+        ns = self.parse(args="")
+        self.assertEqual(ns.x, "1")
+
+    def testMultipleConfigFileArgs(self):
+        config_file1 = "/mem/config1.ini"
+        config_file2 = "/mem/config2.ini"
+        self.initParser(config_file_open_func=self.inMemoryOpenFunc({
+            config_file1: "x = 1\ny = 1", config_file2: "y = 2"}))
+        self.add_arg("-c", "--config", is_config_file=True)
+        self.add_arg("-d", "--config2", is_config_file=True)
+        self.add_arg("--x")
+        self.add_arg("--y")
+        ns = self.parse(args=["-c", config_file1, "-d", config_file2])
+        self.assertEqual(ns.x, "1")
+        self.assertEqual(ns.y, "2")
+        ns = self.parse(args=["-d", config_file2])
+        self.assertIsNone(ns.x)
+        self.assertEqual(ns.y, "2")
+
+    def testParsedConfigFileCache(self):
+        parse_calls = []
+
+        class CountingConfigFileParser(configargparse.DefaultConfigFileParser):
+            def parse(self, stream):
+                parse_calls.append(stream.name)
+                return super().parse(stream)
+
+        config_file = self.tmpFile()
+        config_file.write("x = [a, b]")
+        config_file.flush()
+
+        self.initParser(config_file_parser_class=CountingConfigFileParser,
+                        cache_config_files=True)
+        self.add_arg("-c", "--config", is_config_file=True)
+        self.add_arg("--x", nargs="+")
+
+        # an unchanged file is only parsed once
+        ns = self.parse(args=["-c", config_file.name])
+        self.assertEqual(ns.x, ["a", "b"])
+        ns = self.parse(args=["-c", config_file.name])
+        self.assertEqual(ns.x, ["a", "b"])
+        self.assertEqual(len(parse_calls), 1)
+
+        # modifying the file invalidates the cached result
+        config_file.seek(0)
+        config_file.write("x = [a, b, c]")
+        config_file.flush()
+        ns = self.parse(args=["-c", config_file.name])
+        self.assertEqual(ns.x, ["a", "b", "c"])
+        self.assertEqual(len(parse_calls), 2)
+
+        # so does a same-size rewrite, as long as the mtime changes
+        st = os.stat(config_file.name)
+        config_file.seek(0)
+        config_file.write("x = [a, b, d]")
+        config_file.flush()
+        os.utime(config_file.name,
+                 ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+        ns = self.parse(args=["-c", config_file.name])
+        self.assertEqual(ns.x, ["a", "b", "d"])
+        self.assertEqual(len(parse_calls), 3)
+
+        # clearing the cache forces a re-parse
+        self.parser.clear_config_cache()
+        self.parse(args=["-c", config_file.name])
+        self.assertEqual(len(parse_calls), 4)
+
+        # config_file_contents isn't backed by a file and so is never cached
+        self.parse(args="", config_file_contents="x = [d]")
+        self.parse(args="", config_file_contents="x = [d]")
+        self.assertEqual(len(parse_calls), 6)
+
+        # the cache belongs to the parser, and is off by default
+        self.initParser(config_file_parser_class=CountingConfigFileParser)
+        self.add_arg("-c", "--config", is_config_file=True)
+        self.add_arg("--x", nargs="+")
+        self.parse(args=["-c", config_file.name])
+        self.parse(args=["-c", config_file.name])
+        self.assertEqual(len(parse_calls), 8)
+
+    def testParsedConfigFileCacheThroughSymlink(self):
+        config_file = self.tmpFile()
+        config_file.write("x = 1")
+        config_file.flush()
+        link_path = config_file.name + ".link"
+        try:
+            os.symlink(config_file.name, link_path)
+        except (AttributeError, NotImplementedError, OSError) as e:
+            self.skipTest("can't create symlinks: %s" % e)
+
+        self.initParser(cache_config_files=True)
+        self.add_arg("-c", "--config", is_config_file=True)
+        self.add_arg("--x")
+        self.parse(args=["-c", config_file.name])
+
+        # the same file opened through another path is still the same file
+        with mock.patch.object(self.parser._config_file_parser, "parse") as parse:
+            ns = self.parse(args=["-c", link_path])
+        self.assertEqual(ns.x, "1")
+        parse.assert_not_called()
+
+    def testConfigFilesAreReparsedByDefault(self):
+        config_file = self.tmpFile()
+        config_file.write("x = 1 1")
+        config_file.flush()
+        st = os.stat(config_file.name)
+
+        self.add_arg("-c", "--config", is_config_file=True)
+        self.add_arg("--x")
+        ns = self.parse(args=["-c", config_file.name])
+        self.assertEqual(ns.x, "1 1")
+
+        # a same-size rewrite that keeps the mtime is still picked up
+        config_file.seek(0)
+        config_file.write("x = 1 2")
+        config_file.flush()
+        os.utime(config_file.name, ns=(st.st_atime_ns, st.st_mtime_ns))
+        ns = self.parse(args=["-c", config_file.name])
+        self.assertEqual(ns.x, "1 2")
+
 class TestConfigFileParsers(TestCase):
     """Test ConfigFileParser subclasses in isolation"""
 
@@ -1195,6 +1447,29 @@ class TestConfigFileParsers(TestCase):
         self.assertListEqual(parsed_obj['_list_arg1'], ['a', 'b', 'c'])
         self.assertListEqual(parsed_obj['_list_arg2'], [1, 2, 3])
 
+    def testDefaultConfigFileParser_UnexpectedLine(self):
+        p = configargparse.DefaultConfigFileParser()
+        stream = StringIO("a = 1\n=oops\n")
+        stream.name = "broken.ini"
+
+        with self.assertRaises(configargparse.ConfigFileParserException) as cm:
+            p.parse(stream)
+        self.assertEqual(str(cm.exception), "Unexpected line 1 in broken.ini: =oops")
+        self.assertEqual(cm.exception.lineno, 1)
+        self.assertEqual(cm.exception.name, "broken.ini")
+        self.assertEqual(cm.exception.line, "=oops")
+
+        # the extra fields survive pickling (eg. to another process)
+        e = pickle.loads(pickle.dumps(cm.exception))
+        self.assertEqual(str(e), str(cm.exception))
+        self.assertEqual((e.lineno, e.name, e.line), (1, "broken.ini", "=oops"))
+
+    def testConfigFileParserException_Args(self):
+        self.assertEqual(str(configargparse.ConfigFileParserException()), "")
+        e = configargparse.ConfigFileParserException("a", "b")
+        self.assertEqual(e.args, ("a", "b"))
+        self.assertIsNone(e.lineno)
+
     def testDefaultConfigFileParser_BasicValues(self):
         p = configargparse.DefaultConfigFileParser()
 
@@ -1438,6 +1713,59 @@ class TestConfigFileParsers(TestCase):
             self.assertDictEqual(parsed_obj, expected,
                     msg="Line %r" % (test['line']))
 
+    def testTomlConfigParser_Basic(self):
+        try:
+            p = configargparse.TomlConfigParser(['tool.my_tool', 'my_tool'])
+            p._load_toml()
+        except configargparse.ConfigFileParserException:
+            logging.warning("WARNING: tomli/toml not installed. "
+                            "Couldn't test TomlConfigParser")
+            return
+
+        self.assertGreater(len(p.get_syntax_description()), 0)
+
+        # only the first section that is found is used
+        parsed_obj = p.parse(StringIO(
+            '[tool.other_tool]\n'
+            'a = "ignored"\n'
+            '[my_tool]\n'
+            'a = "also ignored"\n'
+            '[tool.my_tool]\n'
+            'a = "3"\n'
+            'flag = true\n'
+            'level = 35\n'
+            'list_arg = [1, 2, 3]\n'))
+        self.assertDictEqual(parsed_obj, {
+            'a': '3', 'flag': 'True', 'level': '35', 'list_arg': [1, 2, 3]})
+
+        self.assertRaisesRegex(configargparse.ConfigFileParserException,
+            "Couldn't parse TOML file", p.parse, StringIO('a = '))
+
+    def testTomlConfigParser_PrefersTomlPackage(self):
+        # files that loaded with the toml package keep loading with it
+        fake_toml = types.ModuleType("toml")
+        fake_toml.loads = mock.Mock(return_value={"my_tool": {"a": 1}})
+        p = configargparse.TomlConfigParser(['my_tool'])
+        with mock.patch.object(configargparse.TomlConfigParser,
+                               "_toml_loads", None), \
+             mock.patch.dict(sys.modules, {"toml": fake_toml}):
+            self.assertDictEqual(p.parse(StringIO("[my_tool]\na = 1\n")),
+                                 {"a": "1"})
+            # the loader is only looked up once
+            self.assertIs(configargparse.TomlConfigParser._toml_loads,
+                          fake_toml.loads)
+        fake_toml.loads.assert_called_once_with("[my_tool]\na = 1\n")
+
+    def testGetTomlSection(self):
+        data = {'a': {'b': {'c': {'x': 1}}, 'e': 'not a table'}}
+        get = configargparse.get_toml_section
+        self.assertEqual(get(data, 'a.b.c'), {'x': 1})
+        self.assertEqual(get(data, ('a', 'b')), {'c': {'x': 1}})
+        self.assertIsNone(get(data, 'a.d'))
+        self.assertIsNone(get(data, 'a.e'))
+        self.assertIsNone(get(data, 'a.e.f'))
+        self.assertIsNone(get(data, 'a.b.c.x'))
+
     def testYAMLConfigFileParser_Basic(self):
         try:
             import yaml
@@ -1457,6 +1785,10 @@ class TestConfigFileParsers(TestCase):
 
         self.assertDictEqual(parsed_obj, {'a': '3'})
 
+        # the libyaml-based loader is used whenever it's available
+        _, loader, _ = p._load_yaml()
+        self.assertIs(loader, getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
     def testYAMLConfigFileParser_All(self):
         try:
             import yaml
@@ -1494,19 +1826,20 @@ class TestConfigFileParsers(TestCase):
                             "Couldn't test YAMLConfigFileParser")
             return
         
-        parser = configargparse.ArgumentParser(config_file_parser_class=configargparse.YAMLConfigFileParser)
+        config_lines = ["verbosity: 3", 
+                        "verbose: true", 
+                        "level: 35"]
+        config_str = "\n".join(config_lines)+"\n"
+        config_file = "/mem/temp_YAMLConfigFileParser.cfg"
+
+        parser = configargparse.ArgumentParser(
+            config_file_parser_class=configargparse.YAMLConfigFileParser,
+            config_file_open_func=self.inMemoryOpenFunc({config_file: config_str}))
         parser.add_argument('-c', '--config', is_config_file=True)
         parser.add_argument('--verbosity', action='count')
         parser.add_argument('--verbose', action='store_true')
         parser.add_argument('--level', type=int)
 
-        config_lines = ["verbosity: 3", 
-                        "verbose: true", 
-                        "level: 35"]
-        config_str = "\n".join(config_lines)+"\n"
-        config_file = tempfile.gettempdir()+"/temp_YAMLConfigFileParser.cfg"
-        with open(config_file, 'w') as f:
-            f.write(config_str)
         args = parser.parse_args(["--config=%s"%config_file])
         assert args.verbosity == 3
         assert args.verbose == True
@@ -1517,48 +1850,67 @@ class TestConfigFileParsers(TestCase):
 # in all situations, run argparse unittests on configargparse by modifying
 # their source code to use configargparse.ArgumentParser
 
-try:
-    import test.test_argparse
-    #Sig = test.test_argparse.Sig
-    #NS = test.test_argparse.NS
-except ImportError:
-    logging.error("\n\n"
-        "============================\n"
-        "ERROR: Many tests couldn't be run because 'import test.test_argparse' "
-        "failed. Try building/installing python from source rather than through"
-        " a package manager.\n"
-        "============================\n")
+# set CONFIGARGPARSE_SKIP_ARGPARSE_TESTS=1 to only run configargparse's own
+# tests (eg. while working on them), without importing, rewriting and
+# collecting the much larger argparse test suite
+if os.environ.get("CONFIGARGPARSE_SKIP_ARGPARSE_TESTS"):
+    logging.info("Skipping argparse's unittests because "
+                 "CONFIGARGPARSE_SKIP_ARGPARSE_TESTS is set")
 else:
-    test_argparse_source_code = inspect.getsource(test.test_argparse)
-    test_argparse_source_code = test_argparse_source_code.replace(
-        'argparse.ArgumentParser', 'configargparse.ArgumentParser').replace(
-        'TestHelpFormattingMetaclass', '_TestHelpFormattingMetaclass').replace(
-        'test_main', '_test_main')
-
-    # pytest tries to collect tests from TestHelpFormattingMetaclass, and
-    # test_main, and raises a warning when it finds it's not a test class
-    # nor test function. Renaming TestHelpFormattingMetaclass and test_main
-    # prevents pytest from trying.
-
-    # run or debug a subset of the argparse tests
-    #test_argparse_source_code = test_argparse_source_code.replace(
-    #   "(TestCase)", "").replace(
-    #   "(ParserTestCase)", "").replace(
-    #   "(HelpTestCase)", "").replace(
-    #   ", TestCase", "").replace(
-    #   ", ParserTestCase", "")
-    #test_argparse_source_code = test_argparse_source_code.replace(
-    #   "class TestMessageContentError", "class TestMessageContentError(TestCase)")
-
-    exec(test_argparse_source_code)
-
-    # print argparse unittest source code
-    def print_source_code(source_code, line_numbers, context_lines=10):
-         for n in line_numbers:
-             logging.debug("##### Code around line %s #####" % n)
-             lines_to_print = set(range(n - context_lines, n + context_lines))
-             for n2, line in enumerate(source_code.split("\n"), 1):
-                 if n2 in lines_to_print:
-                     logging.debug("%s %5d: %s" % (
-                        "**" if n2 == n else "  ", n2, line))
-    #print_source_code(test_argparse_source_code, [4540, 4565])
+    try:
+        import test.test_argparse
+        #Sig = test.test_argparse.Sig
+        #NS = test.test_argparse.NS
+    except ImportError:
+        logging.error("\n\n"
+            "============================\n"
+            "ERROR: Many tests couldn't be run because 'import test.test_argparse' "
+            "failed. Try building/installing python from source rather than through"
+            " a package manager.\n"
+            "============================\n")
+    else:
+        # these are all plain identifiers, and str.replace() is many times faster
+        # on the (large) source string than a regex pass with a callback
+        test_argparse_replacements = {
+            'argparse.ArgumentParser': 'configargparse.ArgumentParser',
+            # pytest tries to collect tests from TestHelpFormattingMetaclass, and
+            # test_main, and raises a warning when it finds it's not a test class
+            # nor test function. Renaming TestHelpFormattingMetaclass and test_main
+            # prevents pytest from trying.
+            'TestHelpFormattingMetaclass': '_TestHelpFormattingMetaclass',
+            'test_main': '_test_main',
+
+            # run or debug a subset of the argparse tests
+            #"(TestCase)": "",
+            #"(ParserTestCase)": "",
+            #"(HelpTestCase)": "",
+            #", TestCase": "",
+            #", ParserTestCase": "",
+            #"class TestMessageContentError": "class TestMessageContentError(TestCase)",
+        }
+        def get_test_argparse_source_code():
+            """Returns test.test_argparse's source code, with the above
+            replacements applied.
+            """
+            source_code = inspect.getsource(test.test_argparse)
+            for old_name, new_name in test_argparse_replacements.items():
+                source_code = source_code.replace(old_name, new_name)
+            return source_code
+
+        exec(compile(get_test_argparse_source_code(),
+                     test.test_argparse.__file__, "exec"), globals())
+
+        # print argparse unittest source code
+        def print_source_code(source_code, line_numbers, context_lines=10):
+             # everything below is logged at DEBUG level, so don't even
+             # split the source if that isn't going to be shown
+             if not logger.isEnabledFor(logging.DEBUG):
+                 return
+             source_lines = source_code.split("\n")
+             for n in line_numbers:
+                 logging.debug("##### Code around line %s #####", n)
+                 first_line = max(n - context_lines, 1)
+                 for n2 in range(first_line, min(n + context_lines, len(source_lines) + 1)):
+                     logging.debug("%s %5d: %s",
+                        "**" if n2 == n else "  ", n2, source_lines[n2 - 1])
+        #print_source_code(get_test_argparse_source_code(), [4540, 4565])